@@ -1,22 +1,49 @@
 # -*- coding: utf-8 -*-
+import collections
+import csv
+import os
+import queue
 import sys
+import threading
 from pathlib import Path
 
 import numpy as np
 import pandas as pd
 import wfdb
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import QObject, QRunnable, Qt, QThreadPool, QTimer, pyqtSignal
 from PyQt5.QtGui import QKeySequence
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout,
     QHBoxLayout, QPushButton, QLabel, QFileDialog,
-    QInputDialog, QMessageBox
+    QInputDialog, QMessageBox, QShortcut
 )
+import matplotlib as mpl
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.collections import LineCollection
 from matplotlib.figure import Figure
 
+# ECG 曲线近似共线的点很多，让 Agg 在像素精度内先做路径简化再栅格化
+mpl.rcParams['path.simplify'] = True
+mpl.rcParams['path.simplify_threshold'] = 1.0
+mpl.rcParams['agg.path.chunksize'] = 10000
+
+# 每条记录只看前这么多秒
+PREVIEW_SECONDS = 10
+
+
+def _read_preview(prefix):
+    # 先读头拿 fs，再只解码要画的前几秒，长记录不用整条读进来
+    header = wfdb.rdheader(prefix)
+    sampto = None
+    if header.fs and header.sig_len:
+        sampto = min(int(header.fs * PREVIEW_SECONDS), header.sig_len)
+    return wfdb.rdrecord(prefix, sampto=sampto)
+
 
 class ECGCanvas(FigureCanvas):
+    # 整幅像素缓存最多留这么多条记录
+    IMG_CACHE_MAX = 8
+
     def __init__(self):
         self.fig = Figure(figsize=(12, 10), facecolor='#121212', dpi=100)
         self.fig.subplots_adjust(
@@ -27,52 +54,263 @@ class ECGCanvas(FigureCanvas):
             bottom=0.05
         )
         super().__init__(self.fig)
-        self.axes = []
+        self.ax = None
+        self._lc = None
+        self._bg = None
+        self._key = None
+        # (limit, fs) -> 时间轴，同一批记录参数一样，不必每次重建
+        self._t_cache = {}
+
+        # 最近画过的记录的整幅像素，按下 Prev 时直接贴回来
+        self._img_cache = collections.OrderedDict()
+        self._pending_cache_key = None
+        # 贴过缓存帧后 artists 和屏幕内容就对不上了，整体重绘时不能再画旧波形
+        self._stale = False
+        self.on_stale = None
+
+        # 每次整体重绘（含窗口缩放）后重新截背景，再补画波形
+        self.mpl_connect('draw_event', self._on_draw)
+        self.mpl_connect('resize_event', self._on_resize)
+
+    def _on_draw(self, event):
+        self._bg = self.copy_from_bbox(self.fig.bbox)
+        if self._stale:
+            # artists 还停在之前画过的记录上，画出来就是错的波形；
+            # 跳过补画，请标注器重新加载当前这条
+            self._stale = False
+            self._pending_cache_key = None
+            if self.on_stale is not None:
+                self.on_stale()
+            return
+        if self.ax is not None and self._lc is not None:
+            self.ax.draw_artist(self._lc)
+        if self._pending_cache_key is not None:
+            self._remember(self._pending_cache_key)
+            self._pending_cache_key = None
+
+    def _on_resize(self, event):
+        # 尺寸一变，旧像素全作废
+        self._img_cache.clear()
+
+    def _remember(self, key):
+        self._img_cache[key] = self.copy_from_bbox(self.fig.bbox)
+        self._img_cache.move_to_end(key)
+        while len(self._img_cache) > self.IMG_CACHE_MAX:
+            self._img_cache.popitem(last=False)
+
+    def show_cached(self, key):
+        buf = self._img_cache.get(key)
+        if buf is None:
+            return False
+
+        self._img_cache.move_to_end(key)
+        self.restore_region(buf)
+        self.blit(self.fig.bbox)
+        self._stale = True
+        return True
+
+    def _envelope(self, t, y, target):
+        # 每个像素列只留最小/最大两个点，屏幕上看不出差别
+        step = len(y) // target
+        n = target * step
+        chunks = y[:n].reshape(target, step)
+        y2 = np.stack([chunks.min(1), chunks.max(1)], axis=1).ravel()
+        t2 = np.repeat(t[:n:step], 2)
+        return t2, y2
+
+    def _to_lane(self, yd, offset):
+        # 每条导联各自归一化到自己的水平带里（原来每个子图也是各自缩放的）
+        lo = float(np.nanmin(yd)) if len(yd) else 0.0
+        hi = float(np.nanmax(yd)) if len(yd) else 0.0
+        if not np.isfinite(lo) or not np.isfinite(hi):
+            return np.full_like(yd, offset)
+        span = (hi - lo) or 1.0
+        return offset + (yd - (lo + hi) / 2.0) / span * 0.9
+
+    def draw_record(self, record, cache_key=None):
+        self._pending_cache_key = None
+        self._stale = False
 
-    def draw_record(self, record):
         num = record.n_sig
-        sig = record.p_signal
         fs = record.fs
 
-        limit = min(int(fs * 10), sig.shape[0])
-        t = np.arange(limit) / fs
-
-        # 如果导联数量变了再重建
-        if len(self.axes) != num:
-            self.fig.clear()
-            self.axes = self.fig.subplots(num, 1, sharex=True)
-            if num == 1:
-                self.axes = [self.axes]
-
-        for i, ax in enumerate(self.axes):
-            ax.clear()
-            ax.plot(t, sig[:limit, i], lw=0.8, color='#00FFCC')
-
-            ax.set_facecolor('#121212')
-            ax.set_yticks([])
-
-            name = record.sig_name[i] if i < len(record.sig_name) else f"L{i+1}"
-            ax.set_ylabel(
-                name,
-                rotation=0,
-                labelpad=25,
-                color='#AAAAAA',
-                fontsize=10,
-                va='center'
-            )
+        limit = min(int(fs * PREVIEW_SECONDS), record.p_signal.shape[0])
+        # 一次性转 float32 并转置成导联在前，每条导联切片都是连续内存
+        sig = np.ascontiguousarray(record.p_signal[:limit].T, dtype=np.float32)
+
+        t = self._t_cache.get((limit, fs))
+        if t is None:
+            # float32 足够像素精度，内存带宽减半
+            t = np.arange(limit, dtype=np.float32) / fs
+            self._t_cache[(limit, fs)] = t
+
+        # 画布横向只有这么多像素，点数超过两倍就抽稀
+        target = int(self.fig.get_size_inches()[0] * self.fig.dpi)
+
+        data = []
+        for i in range(num):
+            if limit > 2 * target:
+                data.append(self._envelope(t, sig[i], target))
+            else:
+                data.append((t, sig[i]))
+
+        names = tuple(
+            record.sig_name[i] if i < len(record.sig_name) else f"L{i+1}"
+            for i in range(num)
+        )
+        key = (num, fs, limit, names)
+
+        # 所有导联拼进一个 LineCollection，一次 draw 画完
+        segments = [
+            np.column_stack([td, self._to_lane(yd, num - 1 - i)])
+            for i, (td, yd) in enumerate(data)
+        ]
+        xmax = data[0][0][-1] if len(data[0][0]) else None
+
+        # 布局没变时只更新波形并 blit，跳过网格/刻度的整体重绘
+        if key == self._key and self._bg is not None:
+            self._lc.set_segments(segments)
+            self.restore_region(self._bg)
+            self.ax.draw_artist(self._lc)
+            self.blit(self.fig.bbox)
+            if cache_key is not None:
+                self._remember(cache_key)
+            return
+
+        rebuild = self.ax is None or self._key is None or self._key[0] != num
+        self._key = key
+        # 整体重绘是异步的，画完那次 draw_event 里再截图进缓存
+        self._pending_cache_key = cache_key
+
+        if not rebuild:
+            # 轴能复用：静态样式都在，只换数据、导联名和 x 范围
+            self._lc.set_segments(segments)
+            self.ax.set_yticklabels(names[::-1], color='#AAAAAA', fontsize=10)
+            if xmax:
+                self.ax.set_xlim(0, xmax)
+            self.draw_idle()
+            return
 
-            ax.grid(True, which='major', color='#333333', lw=0.6)
-            ax.minorticks_on()
-            ax.grid(True, which='minor', color='#222222', linestyle=':', lw=0.4)
+        self._build_axes(num, names, segments, xmax)
 
-            for s in ax.spines.values():
-                s.set_color('#444444')
+    def _build_axes(self, num, names, segments, xmax):
+        self.fig.clear()
+        ax = self.fig.add_subplot(111)
+        self.ax = ax
+
+        # animated 的集合不参与常规绘制，方便截取纯背景
+        self._lc = LineCollection(
+            segments, colors='#00FFCC', linewidths=0.8, animated=True
+        )
+        ax.add_collection(self._lc)
 
-        self.axes[-1].set_xlabel("Time (s)", color='#AAAAAA')
+        ax.set_facecolor('#121212')
+        ax.set_ylim(-0.6, num - 0.4)
+        ax.set_yticks(range(num))
+        ax.set_yticklabels(names[::-1], color='#AAAAAA', fontsize=10)
+        ax.tick_params(axis='y', which='both', length=0)
+
+        ax.grid(True, which='major', axis='x', color='#333333', lw=0.6)
+        ax.minorticks_on()
+        ax.grid(True, which='minor', axis='x', color='#222222',
+                linestyle=':', lw=0.4)
+
+        for s in ax.spines.values():
+            s.set_color('#444444')
+
+        if xmax:
+            ax.set_xlim(0, xmax)
+        ax.set_xlabel("Time (s)", color='#AAAAAA')
+        self.draw_idle()
+
+    def clear(self):
+        self.fig.clear()
+        self.ax = None
+        self._lc = None
+        self._bg = None
+        self._key = None
+        self._pending_cache_key = None
+        self._stale = False
         self.draw_idle()
 
 
+class _LoaderSignals(QObject):
+    loaded = pyqtSignal(int, int, object)
+
+
+class RecordLoader(QRunnable):
+    """后台预读下一条记录，翻页时直接用解析好的结果。"""
+
+    def __init__(self, gen, index, prefix):
+        super().__init__()
+        self.gen = gen
+        self.index = index
+        self.prefix = prefix
+        self.signals = _LoaderSignals()
+
+    def run(self):
+        try:
+            record = _read_preview(self.prefix)
+        except Exception:
+            # 预读失败直接丢弃，翻到时同步读会把错误报出来
+            return
+        self.signals.loaded.emit(self.gen, self.index, record)
+
+
+class _JournalWriter(threading.Thread):
+    """单写线程按顺序落盘标注行，UI 线程不再等 flush/fsync。
+
+    守护线程：不走 closeEvent 的退出（比如登录框点了取消）
+    也不会因为它还堵在 get() 上而卡住进程。
+    """
+
+    def __init__(self, q):
+        super().__init__(daemon=True)
+        self.q = q
+
+    def run(self):
+        while True:
+            item = self.q.get()
+            try:
+                if item is None:
+                    return
+                writer, fp, row = item
+                writer.writerow(row)
+                fp.flush()
+                os.fsync(fp.fileno())
+            except Exception:
+                # 日志写失败先忽略，收尾的整表重写还会兜底
+                pass
+            finally:
+                self.q.task_done()
+
+
 class ECGAnnotator(QMainWindow):
+    COLS = [
+        'filename',
+        'foldername',
+        'is_malignant',
+        'annotator',
+        'is_malignant_2nd',
+        'annotator_2nd'
+    ]
+
+    # 原地修改攒够这么多条就整体重写一次
+    FLUSH_EVERY = 25
+
+    # 新行攒够这么多条再一次性并入 DataFrame
+    PENDING_MAX = 50
+
+    # 状态栏样式只在这里解析一次，状态切换时才重新 setStyleSheet
+    _SS_OK = (
+        "color:#FFCA28;font-size:14px;padding:15px;"
+        "background:#262626;border-radius:6px;"
+    )
+    _SS_ERR = (
+        "color:#FF5252;font-size:14px;padding:15px;"
+        "background:#262626;border-radius:6px;"
+    )
+
     def __init__(self):
         super().__init__()
 
@@ -83,33 +321,157 @@ class ECGAnnotator(QMainWindow):
         self.cur = -1
         self.recheck_mode = False
 
+        # 预读缓存：index -> 已解析的 record；换任务列表时代数加一作废旧结果
+        self._prefetch = {}
+        self._gen = 0
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+        # 连续按键时合并重绘：30ms 内的多次翻页只画最后一条
+        self._show_timer = QTimer(self)
+        self._show_timer.setSingleShot(True)
+        self._show_timer.setInterval(30)
+        self._show_timer.timeout.connect(self._do_show)
+
         self.db_path = Path(__file__).parent / "annotations.csv"
+        self.pq_path = self.db_path.with_suffix('.parquet')
         self.df = self._load_db()
+        # 已标注文件名的缓存，保存时增量维护，避免每次导入重新生成
+        self._done = set(self.df.index.astype(str))
+
+        self._dirty = False
+        self._edits = 0
+        # 新行先攒在这（按文件名去重），避免逐行 loc 追加整表重排
+        self._pending = {}
+        self._open_journal()
+
+        # 日志行排进单写队列，由后台线程落盘
+        self._wq = queue.Queue()
+        _JournalWriter(self._wq).start()
 
         self._init_ui()
         self._bind_keys()
         self._login()
 
     def _load_db(self):
-        if self.db_path.exists():
+        df = None
+
+        # 优先读 parquet 快照；csv 更新（追加过日志）时以 csv 为准
+        if self.pq_path.exists() and not (
+            self.db_path.exists()
+            and self.db_path.stat().st_mtime > self.pq_path.stat().st_mtime
+        ):
             try:
-                return pd.read_csv(
-                    self.db_path,
-                    encoding='utf-8-sig',
-                    dtype={'filename': str}
-                )
+                df = pd.read_parquet(self.pq_path)
             except Exception:
-                pass
+                df = None
+
+        if df is None and self.db_path.exists():
+            # pyarrow 引擎解析快得多，没装就退回默认引擎
+            for engine in ('pyarrow', 'c'):
+                try:
+                    df = pd.read_csv(
+                        self.db_path,
+                        encoding='utf-8-sig',
+                        dtype={
+                            'filename': str,
+                            'is_malignant': 'Int16',
+                            'is_malignant_2nd': 'Int16'
+                        },
+                        engine=engine
+                    )
+                    break
+                except Exception:
+                    df = None
+
+        if df is None:
+            df = pd.DataFrame(columns=self.COLS)
+
+        # 按文件名建索引，查找从整列扫描变成哈希；同名取最后一条
+        if 'filename' in df.columns:
+            df = df.drop_duplicates('filename', keep='last')
+            df.set_index('filename', inplace=True)
+
+        # 旧版 csv 可能没有二次复核那两列：缺的补上、多余的丢掉，
+        # 保证表结构始终和日志行/整表重写一致
+        df = df.reindex(columns=self.COLS[1:])
+
+        # 标签列固定成可空 Int16，之后 .at 赋值是原位标量写，
+        # 不会因 int 写进 float 列触发整列升格重拷
+        for col in ('is_malignant', 'is_malignant_2nd'):
+            if col in df.columns:
+                try:
+                    df[col] = df[col].astype('Int16')
+                except Exception:
+                    pass
+        return df
+
+    def _open_journal(self):
+        # 旧版文件表头少列的话，先按完整表结构重写一次，
+        # 否则追加的 6 列日志行会把文件弄得没法再解析
+        if self.db_path.exists() and self.db_path.stat().st_size > 0:
+            try:
+                with open(self.db_path, encoding='utf-8-sig', newline='') as f:
+                    header = next(csv.reader(f), None)
+            except Exception:
+                header = None
+            if header != self.COLS:
+                tmp = self.db_path.with_name(self.db_path.name + '.tmp')
+                self.df.to_csv(tmp, encoding='utf-8-sig')
+                os.replace(tmp, self.db_path)
+
+        # 追加模式常开，新行只写一条，不再整表重写
+        is_new = not self.db_path.exists() or self.db_path.stat().st_size == 0
+        self._fp = open(self.db_path, 'a', encoding='utf-8-sig', newline='')
+        self._writer = csv.writer(self._fp)
+        if is_new:
+            self._writer.writerow(self.COLS)
+            self._fp.flush()
+
+    def _append_row(self, row):
+        # 只入队，不在 UI 线程上等磁盘
+        self._wq.put((self._writer, self._fp, row))
+
+    def _merge_pending(self):
+        if not self._pending:
+            return
 
-        cols = [
-            'filename',
-            'foldername',
-            'is_malignant',
-            'annotator',
-            'is_malignant_2nd',
-            'annotator_2nd'
-        ]
-        return pd.DataFrame(columns=cols)
+        add = pd.DataFrame.from_dict(self._pending, orient='index')
+        add.index.name = 'filename'
+        self.df = pd.concat([self.df, add])
+        self._pending.clear()
+
+    def _flush_db(self):
+        self._merge_pending()
+
+        # 原地修改走这里：写临时文件再原子替换
+        if not self._dirty:
+            return
+
+        # 等写线程把排队的行落完再动文件
+        self._wq.join()
+        self._fp.close()
+        tmp = self.db_path.with_name(self.db_path.name + '.tmp')
+        self.df.to_csv(tmp, encoding='utf-8-sig')
+        os.replace(tmp, self.db_path)
+        self._save_parquet()
+
+        self._dirty = False
+        self._open_journal()
+
+    def _save_parquet(self):
+        try:
+            self.df.to_parquet(self.pq_path)
+        except Exception:
+            pass  # 没装 pyarrow 就只留 csv
+
+    def closeEvent(self, event):
+        self._flush_db()
+        self._save_parquet()
+        self._wq.join()
+        self._wq.put(None)
+        self._fp.close()
+        super().closeEvent(event)
 
     def _init_ui(self):
         self.setWindowTitle("ECG Annotation Tool")
@@ -138,9 +500,8 @@ class ECGAnnotator(QMainWindow):
 
         self.status_label = QLabel("未加载数据")
         self.status_label.setAlignment(Qt.AlignCenter)
-        self.status_label.setStyleSheet(
-            "color:#FFCA28;font-size:14px;padding:15px;background:#262626;border-radius:6px;"
-        )
+        self._status_state = None
+        self._set_status_style('ok')
 
         btn_load = QPushButton("加载数据")
         btn_load.clicked.connect(self.import_folder)
@@ -175,6 +536,8 @@ class ECGAnnotator(QMainWindow):
         side.addWidget(btn_unknown)
 
         self.canvas = ECGCanvas()
+        # 缓存帧被整体重绘冲掉时，重新加载当前记录
+        self.canvas.on_stale = self.show_current
 
         layout.addLayout(side, 1)
         layout.addWidget(self.canvas, 6)
@@ -189,11 +552,16 @@ class ECGAnnotator(QMainWindow):
         }
 
         for k, func in mapping.items():
-            shortcut = QKeySequence(k) if len(k) == 1 else getattr(Qt, f"Key_{k}")
-            btn = QPushButton(self)
-            btn.setShortcut(shortcut)
-            btn.hide()
-            btn.clicked.connect(func)
+            seq = QKeySequence(k if len(k) == 1 else getattr(Qt, f"Key_{k}"))
+            QShortcut(seq, self).activated.connect(func)
+
+    def _set_status_style(self, state):
+        if self._status_state == state:
+            return
+        self.status_label.setStyleSheet(
+            self._SS_OK if state == 'ok' else self._SS_ERR
+        )
+        self._status_state = state
 
     def _login(self):
         name, ok = QInputDialog.getText(self, '标注ID', '请输入标注人员ID:')
@@ -211,27 +579,34 @@ class ECGAnnotator(QMainWindow):
         self.root = Path(path)
         self.recheck_mode = False
 
-        done = set(self.df['filename'].astype(str).tolist())
-        dirs = sorted([d for d in self.root.iterdir() if d.is_dir()])
-        self.tasks = [d for d in dirs if d.name not in done]
+        done = self._done
+        # scandir 直接用 dirent 类型，不必为 is_dir 再 stat 一遍；排字符串也比排 Path 快
+        with os.scandir(self.root) as it:
+            names = sorted(
+                e.name for e in it if e.is_dir(follow_symlinks=False)
+            )
+        self.tasks = [self.root / n for n in names if n not in done]
 
         if not self.tasks:
             QMessageBox.information(self, "完成", "全部文件已经标注完")
             return
 
+        self._reset_prefetch()
         self.cur = 0
         self.show_current()
 
     def start_recheck(self):
+        # 复核要查全量记录，先把攒着的新行并进来
+        self._merge_pending()
+
         if self.df.empty:
             QMessageBox.warning(self, "提示", "没有历史记录")
             return
 
-        mask = self.df['is_malignant'] == 999
-        if 'is_malignant_2nd' in self.df.columns:
-            mask = mask & self.df['is_malignant_2nd'].isna()
-
-        targets = self.df[mask]['filename'].tolist()
+        targets = self.df.query(
+            "is_malignant == 999 and is_malignant_2nd.isna()",
+            engine='python'
+        ).index.tolist()
         if not targets:
             QMessageBox.information(self, "完成", "没有需要二次复核的文件")
             return
@@ -242,17 +617,25 @@ class ECGAnnotator(QMainWindow):
                 return
             self.root = Path(p)
 
+        # 一次 scandir 建好本地目录集合，免得每个目标都走一次 exists()
+        with os.scandir(self.root) as it:
+            local = {e.name for e in it if e.is_dir(follow_symlinks=False)}
+
         self.tasks = [
             self.root / str(f)
             for f in targets
-            if (self.root / str(f)).exists()
+            if str(f) in local
         ]
 
+        self._reset_prefetch()
         self.recheck_mode = True
         self.cur = 0
         self.show_current()
 
     def show_current(self):
+        self._show_timer.start()
+
+    def _do_show(self):
         if self.cur < 0:
             return
         if self.cur >= len(self.tasks):
@@ -262,20 +645,49 @@ class ECGAnnotator(QMainWindow):
         prefix = str(target / target.name)
 
         try:
-            record = wfdb.rdrecord(prefix)
-            self.canvas.draw_record(record)
+            # 刚看过的记录还留着整幅像素，直接贴回来不用重读重画
+            if not self.canvas.show_cached(prefix):
+                record = self._prefetch.pop(self.cur, None)
+                if record is None:
+                    record = _read_preview(prefix)
+                self.canvas.draw_record(record, cache_key=prefix)
 
             tag = "[复核]" if self.recheck_mode else "[首轮]"
+            self._set_status_style('ok')
             self.status_label.setText(
                 f"{tag}\n{target.name}\n({self.cur+1}/{len(self.tasks)})"
             )
             self.statusBar().showMessage("就绪")
+            self._prefetch_next()
         except Exception as e:
+            self._set_status_style('err')
             self.status_label.setText(f"数据异常\n{target.name}")
             self.statusBar().showMessage(f"读取失败: {str(e)}")
 
-            self.canvas.fig.clear()
-            self.canvas.draw_idle()
+            self.canvas.clear()
+
+    def _prefetch_next(self):
+        nxt = self.cur + 1
+        if nxt >= len(self.tasks) or nxt in self._prefetch:
+            return
+
+        target = self.tasks[nxt]
+        loader = RecordLoader(self._gen, nxt, str(target / target.name))
+        loader.signals.loaded.connect(self._on_prefetched)
+        self._pool.start(loader)
+
+    def _on_prefetched(self, gen, index, record):
+        if gen != self._gen:
+            return
+
+        self._prefetch[index] = record
+        # 最多留两条，太旧的清掉
+        while len(self._prefetch) > 2:
+            self._prefetch.pop(next(iter(self._prefetch)))
+
+    def _reset_prefetch(self):
+        self._gen += 1
+        self._prefetch.clear()
 
     def save_and_next(self, val):
         if self.cur < 0:
@@ -284,26 +696,32 @@ class ECGAnnotator(QMainWindow):
             return
 
         name = self.tasks[self.cur].name
-        mask = self.df['filename'].astype(str) == name
 
-        if mask.any():
-            idx = self.df[mask].index[0]
+        if name in self.df.index:
             if self.recheck_mode:
-                self.df.at[idx, 'is_malignant_2nd'] = val
-                self.df.at[idx, 'annotator_2nd'] = self.user
+                self.df.at[name, 'is_malignant_2nd'] = val
+                self.df.at[name, 'annotator_2nd'] = self.user
             else:
-                self.df.at[idx, 'is_malignant'] = val
-                self.df.at[idx, 'annotator'] = self.user
+                self.df.at[name, 'is_malignant'] = val
+                self.df.at[name, 'annotator'] = self.user
+
+            # 改旧行没法追加，标脏、攒够一批再整体重写
+            self._dirty = True
+            self._edits += 1
+            if self._edits % self.FLUSH_EVERY == 0:
+                self._flush_db()
         else:
-            self.df.loc[len(self.df)] = {
-                'filename': name,
+            self._pending[name] = {
                 'foldername': self.root.name,
                 'is_malignant': val,
                 'annotator': self.user
             }
+            if len(self._pending) >= self.PENDING_MAX:
+                self._merge_pending()
+            # 新行只追加一条并落盘，防止程序崩掉丢记录
+            self._append_row([name, self.root.name, val, self.user, '', ''])
 
-        # 每次都写盘，防止程序崩掉丢记录
-        self.df.to_csv(self.db_path, index=False, encoding='utf-8-sig')
+        self._done.add(name)
 
         self.next()
 